@@ -27,6 +27,7 @@ The keyboard implementation for *macOS*.
 import enum
 
 import Quartz
+import six
 
 from pynput._util.darwin import (
     get_unicode_to_keycode_map,
@@ -44,6 +45,16 @@ NX_KEYTYPE_SOUND_UP = 0
 NX_KEYTYPE_NEXT = 17
 NX_KEYTYPE_PREVIOUS = 18
 
+#: The flag bits used to detect caps lock state changes
+_CAPS_BIT8 = 1 << 8
+_CAPS_BIT16 = 1 << 16
+_CAPS_MASK = _CAPS_BIT8 | _CAPS_BIT16
+
+#: Empty modifiers and mapping used when reposting modifier events; these
+#: are only ever read
+_EMPTY_SET = frozenset()
+_EMPTY_MAP = {}
+
 # pylint: disable=C0103; We want to use the names from the C API
 # This is undocumented, but still widely known
 kSystemDefinedEventMediaKeysSubtype = 8
@@ -60,8 +71,30 @@ otherEventWithType = getattr(
         'subtype_'
         'data1_'
         'data2_')
+
+# The functions and constants below are used for every event handled, so we
+# avoid looking them up on the Quartz module each time
+_CGEventCreateKeyboardEvent = Quartz.CGEventCreateKeyboardEvent
+_CGEventGetFlags = Quartz.CGEventGetFlags
+_CGEventGetIntegerValueField = Quartz.CGEventGetIntegerValueField
+_CGEventKeyboardGetUnicodeString = Quartz.CGEventKeyboardGetUnicodeString
+_CGEventKeyboardSetUnicodeString = Quartz.CGEventKeyboardSetUnicodeString
+_CGEventPost = Quartz.CGEventPost
+_CGEventSetFlags = Quartz.CGEventSetFlags
+_eventWithCGEvent = Quartz.NSEvent.eventWithCGEvent_
+_kCGEventFlagMaskControl = Quartz.kCGEventFlagMaskControl
+_kCGEventKeyDown = Quartz.kCGEventKeyDown
+_kCGEventKeyUp = Quartz.kCGEventKeyUp
+_kCGHIDEventTap = Quartz.kCGHIDEventTap
+_kCGKeyboardEventKeycode = Quartz.kCGKeyboardEventKeycode
+_NSEventTypeFlagsChanged = Quartz.NSEventTypeFlagsChanged
+_NSSystemDefined = Quartz.NSSystemDefined
 # pylint: enable=C0103
 
+#: Determines whether a string is printable; *Python 2* strings lack
+#: ``isprintable``, so we fall back on ``isalnum``
+_is_printable = getattr(six.text_type, 'isprintable', six.text_type.isalnum)
+
 
 class KeyCode(_base.KeyCode):
     _PLATFORM_EXTENSIONS = (
@@ -72,6 +105,16 @@ class KeyCode(_base.KeyCode):
     # Be explicit about fields
     _is_media = None
 
+    def __init__(self, *args, **kwargs):
+        super(KeyCode, self).__init__(*args, **kwargs)
+
+        # Media key events are generated often when a key is held, so we
+        # calculate the event data up front
+        if self._is_media:
+            self._media_data1_press = (self.vk << 16) | (0xa << 8)
+            self._media_data1_release = (self.vk << 16) | (0xb << 8)
+            self._event = self._event_media
+
     @classmethod
     def _from_media(cls, vk, **kwargs):
         """Creates a media key from a key code.
@@ -82,10 +125,10 @@ class KeyCode(_base.KeyCode):
         """
         return cls.from_vk(vk, _is_media=True, **kwargs)
 
-    def _event(self, modifiers, mapping, is_pressed):
-        """This key as a *Quartz* event.
+    def _event_normal(self, modifiers, mapping, is_pressed):
+        """This key as a *Quartz* keyboard event.
 
-        :param set modifiers: The currently active modifiers.
+        :param frozenset modifiers: The currently active modifiers.
 
         :param mapping: The current keyboard mapping.
 
@@ -94,45 +137,48 @@ class KeyCode(_base.KeyCode):
         :return: a *Quartz* event
         """
         vk = self.vk or mapping.get(self.char)
-        if self._is_media:
-            result = otherEventWithType(
-                Quartz.NSSystemDefined,
-                (0, 0),
-                0xa00 if is_pressed else 0xb00,
-                0,
-                0,
-                0,
-                8,
-                (self.vk << 16) | ((0xa if is_pressed else 0xb) << 8),
-                -1).CGEvent()
-        else:
-            result = Quartz.CGEventCreateKeyboardEvent(
-                None, 0 if vk is None else vk, is_pressed)
+        result = _CGEventCreateKeyboardEvent(
+            None, 0 if vk is None else vk, is_pressed)
 
-        Quartz.CGEventSetFlags(
-            result,
-            0
-            | (Quartz.kCGEventFlagMaskAlternate
-               if Key.alt in modifiers else 0)
+        _CGEventSetFlags(result, _modifier_flags(modifiers))
 
-            | (Quartz.kCGEventFlagMaskCommand
-               if Key.cmd in modifiers else 0)
+        if vk is None and self.char is not None:
+            _CGEventKeyboardSetUnicodeString(
+                result, len(self.char), self.char)
 
-            | (Quartz.kCGEventFlagMaskControl
-               if Key.ctrl in modifiers else 0)
+        return result
 
-            | (Quartz.kCGEventFlagMaskShift
-               if Key.shift in modifiers else 0)
+    def _event_media(self, modifiers, _mapping, is_pressed):
+        """This media key as a *Quartz* system defined event.
 
-            | (Quartz.kCGEventFlagMaskSecondaryFn
-               if Key.fn in modifiers else 0))
+        :param frozenset modifiers: The currently active modifiers.
 
-        if vk is None and self.char is not None:
-            Quartz.CGEventKeyboardSetUnicodeString(
-                result, len(self.char), self.char)
+        :param mapping: The current keyboard mapping.
+
+        :param bool is_press: Whether to generate a press event.
+
+        :return: a *Quartz* event
+        """
+        result = otherEventWithType(
+            _NSSystemDefined,
+            (0, 0),
+            0xa00 if is_pressed else 0xb00,
+            0,
+            0,
+            0,
+            8,
+            self._media_data1_press if is_pressed
+            else self._media_data1_release,
+            -1).CGEvent()
+
+        _CGEventSetFlags(result, _modifier_flags(modifiers))
 
         return result
 
+    #: This key as a *Quartz* event; media keys override this with
+    #: :meth:`_event_media` when created
+    _event = _event_normal
+
 
 # pylint: disable=W0212
 class Key(enum.Enum):
@@ -196,6 +242,65 @@ class Key(enum.Enum):
 # pylint: enable=W0212
 
 
+#: The event flags set for the various modifier keys
+_MODIFIER_FLAGS = {
+    Key.alt: Quartz.kCGEventFlagMaskAlternate,
+    Key.alt_l: Quartz.kCGEventFlagMaskAlternate,
+    Key.alt_r: Quartz.kCGEventFlagMaskAlternate,
+    Key.cmd: Quartz.kCGEventFlagMaskCommand,
+    Key.cmd_l: Quartz.kCGEventFlagMaskCommand,
+    Key.cmd_r: Quartz.kCGEventFlagMaskCommand,
+    Key.ctrl: Quartz.kCGEventFlagMaskControl,
+    Key.ctrl_l: Quartz.kCGEventFlagMaskControl,
+    Key.ctrl_r: Quartz.kCGEventFlagMaskControl,
+    Key.shift: Quartz.kCGEventFlagMaskShift,
+    Key.shift_l: Quartz.kCGEventFlagMaskShift,
+    Key.shift_r: Quartz.kCGEventFlagMaskShift,
+    Key.fn: Quartz.kCGEventFlagMaskSecondaryFn}
+
+#: The event flags for combinations of modifiers already seen
+_MODIFIER_COMBINATION_FLAGS = {}
+
+
+def _modifier_flags(modifiers):
+    """Calculates the event flags for a combination of modifiers.
+
+    Only a handful of combinations are ever used, so the results are cached.
+
+    :param frozenset modifiers: The currently active modifiers.
+
+    :return: the event flags
+    """
+    try:
+        return _MODIFIER_COMBINATION_FLAGS[modifiers]
+    except KeyError:
+        flags = 0
+        for modifier in modifiers:
+            flags |= _MODIFIER_FLAGS.get(modifier, 0)
+        _MODIFIER_COMBINATION_FLAGS[modifiers] = flags
+        return flags
+
+
+# pylint: disable=W0212
+#: A mapping from media key code to special key
+_SPECIAL_KEYS_MEDIA = {
+    key.value.vk: key
+    for key in Key
+    if key.value._is_media}
+
+#: A table of special keys indexed by virtual key code
+_SPECIAL_KEYS_NORMAL = [None] * 256
+for _key in Key:
+    if not _key.value._is_media:
+        _SPECIAL_KEYS_NORMAL[_key.value.vk] = _key
+del _key
+# pylint: enable=W0212
+
+#: Shared key codes for the virtual key codes used when no character can be
+#: determined for an event
+_VK_CACHE = [KeyCode.from_vk(vk) for vk in range(256)]
+
+
 class Controller(_base.Controller):
     _KeyCode = KeyCode
     _Key = Key
@@ -206,10 +311,10 @@ class Controller(_base.Controller):
 
     def _handle(self, key, is_press):
         with self.modifiers as modifiers:
-            Quartz.CGEventPost(
-                Quartz.kCGHIDEventTap,
-                (key if key not in (k for k in Key) else key.value)._event(
-                    modifiers, self._mapping, is_press))
+            _CGEventPost(
+                _kCGHIDEventTap,
+                (key.value if isinstance(key, Key) else key)._event(
+                    frozenset(modifiers), self._mapping, is_press))
 
 
 class Listener(ListenerMixin, _base.Listener):
@@ -221,28 +326,14 @@ class Listener(ListenerMixin, _base.Listener):
         Quartz.CGEventMaskBit(Quartz.NSSystemDefined)
     )
 
-    # pylint: disable=W0212
-    #: A mapping from keysym to special key
-    _SPECIAL_KEYS = {
-        (key.value.vk, key.value._is_media): key
-        for key in Key}
-    # pylint: enable=W0212
+    #: A mapping from media key code to special key
+    _SPECIAL_KEYS_MEDIA = _SPECIAL_KEYS_MEDIA
+
+    #: A table of special keys indexed by virtual key code
+    _SPECIAL_KEYS_NORMAL = _SPECIAL_KEYS_NORMAL
 
     #: The event flags set for the various modifier keys
-    _MODIFIER_FLAGS = {
-        Key.alt: Quartz.kCGEventFlagMaskAlternate,
-        Key.alt_l: Quartz.kCGEventFlagMaskAlternate,
-        Key.alt_r: Quartz.kCGEventFlagMaskAlternate,
-        Key.cmd: Quartz.kCGEventFlagMaskCommand,
-        Key.cmd_l: Quartz.kCGEventFlagMaskCommand,
-        Key.cmd_r: Quartz.kCGEventFlagMaskCommand,
-        Key.ctrl: Quartz.kCGEventFlagMaskControl,
-        Key.ctrl_l: Quartz.kCGEventFlagMaskControl,
-        Key.ctrl_r: Quartz.kCGEventFlagMaskControl,
-        Key.shift: Quartz.kCGEventFlagMaskShift,
-        Key.shift_l: Quartz.kCGEventFlagMaskShift,
-        Key.shift_r: Quartz.kCGEventFlagMaskShift,
-        Key.fn: Quartz.kCGEventFlagMaskSecondaryFn}
+    _MODIFIER_FLAGS = _MODIFIER_FLAGS
 
     def __init__(self, *args, **kwargs):
         super(Listener, self).__init__(*args, **kwargs)
@@ -253,6 +344,13 @@ class Listener(ListenerMixin, _base.Listener):
             None)
         self._is_caps_lock_on = False
 
+        #: The event handlers for the various event types; events of any other
+        #: type are modifier events
+        self._handlers = {
+            _kCGEventKeyDown: self._handle_key_down,
+            _kCGEventKeyUp: self._handle_key_up,
+            _NSSystemDefined: self._handle_system_defined}
+
     def _run(self):
         with keycode_context() as context:
             self._context = context
@@ -264,115 +362,162 @@ class Listener(ListenerMixin, _base.Listener):
     def _handle(self, _proxy, event_type, event, _refcon):
         '''Returns whether to suppress the event after reporting it.
         '''
-        # Convert the event to a KeyCode; this may fail, and in that case we
-        # pass None
-        try:
-            key = self._event_to_key(event)
-        except IndexError:
-            key = None
+        # The flags are needed by most handlers and to track the modifier
+        # state, so only read them once
+        flags = _CGEventGetFlags(event)
 
         should_suppress = False
         try:
-            if event_type == Quartz.kCGEventKeyDown:
-                # This is a normal key press
-                should_suppress = self.on_press(key) == 2
-
-            elif event_type == Quartz.kCGEventKeyUp:
-                # This is a normal key release
-                should_suppress = self.on_release(key) == 2
-
-            elif key == Key.caps_lock:
-                # Use the current flags and new flags to figure whether it's a press
-                if event_type == Quartz.NSEventTypeFlagsChanged:
-                    should_suppress = self.on_press(key) == 2
-                    self._is_caps_lock_on = Quartz.CGEventGetFlags(event) & 1 << 16 > 0
-                else:
-                    should_suppress = self.on_release(key) == 2
-
-            elif event_type == Quartz.NSSystemDefined:
-                sys_event = Quartz.NSEvent.eventWithCGEvent_(event)
-                if sys_event.subtype() == kSystemDefinedEventMediaKeysSubtype:
-                    # The key in the special key dict; True since it is a media
-                    # key
-                    key = ((sys_event.data1() & 0xffff0000) >> 16, True)
-                    if key in self._SPECIAL_KEYS:
-                        flags = sys_event.data1() & 0x0000ffff
-                        is_press = ((flags & 0xff00) >> 8) == 0x0a
-                        if is_press:
-                            should_suppress = self.on_press(self._SPECIAL_KEYS[key]) == 2
-                        else:
-                            should_suppress = self.on_release(self._SPECIAL_KEYS[key]) == 2
-
-            else:
-                # This is a modifier event---excluding caps lock---for which we
-                # must check the current modifier state to determine whether
-                # the key was pressed or released
-                if key not in self._MODIFIER_FLAGS:
-                    return False
-
-                flags = Quartz.CGEventGetFlags(event)
-                is_press = flags & self._MODIFIER_FLAGS[key]
-                if is_press:
-                    should_suppress = self.on_press(key) == 2
-                else:
-                    should_suppress = self.on_release(key) == 2
-
-                if should_suppress:
-                    Quartz.CGEventSetFlags(event, self._flags)
-                else:
-                    Quartz.CGEventPost(
-                        Quartz.kCGHIDEventTap,
-                        (key.value)._event(set(), {}, is_press))
-
+            handler = self._handlers.get(event_type, self._handle_modifier)
+            should_suppress = handler(event_type, event, flags)
             return should_suppress
         finally:
             # Store the current flag mask to be able to detect modifier state
             # changes
             if not should_suppress:
-                self._flags = Quartz.CGEventGetFlags(event)
+                self._flags = flags
+
+    def _handle_key_down(self, _event_type, event, flags):
+        """Handles a normal key press.
+
+        :return: whether to suppress the event
+        """
+        return self.on_press(self._event_to_key(event, flags)) == 2
+
+    def _handle_key_up(self, _event_type, event, flags):
+        """Handles a normal key release.
+
+        :return: whether to suppress the event
+        """
+        return self.on_release(self._event_to_key(event, flags)) == 2
+
+    def _handle_caps_lock(self, event_type, _event, flags, key):
+        """Handles a caps lock event.
+
+        :return: whether to suppress the event
+        """
+        # Use the current flags and new flags to figure whether it's a press
+        if event_type == _NSEventTypeFlagsChanged:
+            should_suppress = self.on_press(key) == 2
+            self._is_caps_lock_on = flags & _CAPS_BIT16 > 0
+            return should_suppress
+        else:
+            return self.on_release(key) == 2
+
+    def _handle_system_defined(self, event_type, event, flags):
+        """Handles a system defined event, which may be a caps lock release or
+        a media key event.
+
+        :return: whether to suppress the event
+        """
+        if self._is_caps_lock_release(flags):
+            return self._handle_caps_lock(
+                event_type, event, flags, Key.caps_lock)
+
+        sys_event = _eventWithCGEvent(event)
+        if sys_event.subtype() == kSystemDefinedEventMediaKeysSubtype:
+            data1 = sys_event.data1()
+            key = self._SPECIAL_KEYS_MEDIA.get((data1 & 0xffff0000) >> 16)
+            if key is not None:
+                key_flags = data1 & 0x0000ffff
+                is_press = ((key_flags & 0xff00) >> 8) == 0x0a
+                if is_press:
+                    return self.on_press(key) == 2
+                else:
+                    return self.on_release(key) == 2
+
+        return False
+
+    def _handle_modifier(self, event_type, event, flags):
+        """Handles a modifier event.
+
+        :return: whether to suppress the event
+        """
+        key = self._event_to_modifier_key(event)
+        if key is Key.caps_lock:
+            return self._handle_caps_lock(event_type, event, flags, key)
+
+        # This is a modifier event---excluding caps lock---for which we must
+        # check the current modifier state to determine whether the key was
+        # pressed or released
+        if key not in self._MODIFIER_FLAGS:
+            return False
+
+        is_press = flags & self._MODIFIER_FLAGS[key]
+        if is_press:
+            should_suppress = self.on_press(key) == 2
+        else:
+            should_suppress = self.on_release(key) == 2
+
+        if should_suppress:
+            _CGEventSetFlags(event, self._flags)
+        else:
+            _CGEventPost(
+                _kCGHIDEventTap,
+                (key.value)._event(_EMPTY_SET, _EMPTY_MAP, is_press))
+
+        return should_suppress
+
+    def _is_caps_lock_release(self, flags):
+        """Determines whether a system defined event is a caps lock release.
 
-    def _event_to_key(self, event):
-        """Converts a *Quartz* event to a :class:`KeyCode`.
+        :param int flags: The flags of the event.
+
+        :return: whether the event is a caps lock release
+        """
+        old = self._flags & _CAPS_MASK
+        new = flags & _CAPS_MASK
+        return bool(
+            not old & _CAPS_BIT8 and new & _CAPS_BIT8
+            and (old | new) & _CAPS_BIT16
+            and (not (old ^ new) & _CAPS_BIT16) == self._is_caps_lock_on)
+
+    def _event_to_modifier_key(self, event):
+        """Converts a *Quartz* modifier event to a special key.
+
+        Only special keys are considered, since other keys cannot be
+        modifiers.
 
         :param event: The event to convert.
 
-        :return: a :class:`pynput.keyboard.KeyCode`
+        :return: a :class:`pynput.keyboard.Key`, or ``None`` if the key is not
+            a special key
+        """
+        vk = _CGEventGetIntegerValueField(event, _kCGKeyboardEventKeycode)
+        if 0 <= vk < len(self._SPECIAL_KEYS_NORMAL):
+            return self._SPECIAL_KEYS_NORMAL[vk]
+        else:
+            return None
+
+    def _event_to_key(self, event, flags):
+        """Converts a *Quartz* key event to a :class:`KeyCode`.
+
+        :param event: The event to convert.
 
-        :raises IndexError: if the key code is invalid
+        :param int flags: The flags of the event.
+
+        :return: a :class:`pynput.keyboard.KeyCode`
         """
-        vk = Quartz.CGEventGetIntegerValueField(
-            event, Quartz.kCGKeyboardEventKeycode)
-        event_type = Quartz.CGEventGetType(event)
-        is_media = True if event_type == Quartz.NSSystemDefined else None
-
-        # First hard-check if it's a caps lock release...
-        flags = Quartz.CGEventGetFlags(event)
-        old_8 = self._flags & 1 << 8 > 0
-        new_8 = flags & 1 << 8 > 0
-        old_16 = self._flags & 1 << 16 > 0
-        new_16 = flags & 1 << 16 > 0
-        if event_type == Quartz.NSEventTypeSystemDefined and not old_8 and new_8 \
-                and (old_16 or new_16) and (old_16 == new_16) == self._is_caps_lock_on:
-            return Key.caps_lock
-
-        # ...then try other special keys...
-        key = (vk, is_media)
-        if key in self._SPECIAL_KEYS:
-            return self._SPECIAL_KEYS[key]
+        vk = _CGEventGetIntegerValueField(event, _kCGKeyboardEventKeycode)
+
+        # First try special keys...
+        if 0 <= vk < len(self._SPECIAL_KEYS_NORMAL):
+            key = self._SPECIAL_KEYS_NORMAL[vk]
+            if key is not None:
+                return key
 
         # ...then try characters...
-        length, chars = Quartz.CGEventKeyboardGetUnicodeString(
+        length, chars = _CGEventKeyboardGetUnicodeString(
             event, 100, None, None)
-        try:
-            printable = chars.isprintable()
-        except AttributeError:
-            printable = chars.isalnum()
-        if not printable and vk in SYMBOLS \
-                and Quartz.CGEventGetFlags(event) \
-                & Quartz.kCGEventFlagMaskControl:
-            return KeyCode.from_char(SYMBOLS[vk], vk=vk)
-        elif length > 0:
+        if not _is_printable(chars) and flags & _kCGEventFlagMaskControl:
+            symbol = SYMBOLS.get(vk)
+            if symbol is not None:
+                return KeyCode.from_char(symbol, vk=vk)
+        if length > 0:
             return KeyCode.from_char(chars, vk=vk)
 
         # ...and fall back on a virtual key code
-        return KeyCode.from_vk(vk)
+        if 0 <= vk < len(_VK_CACHE):
+            return _VK_CACHE[vk]
+        else:
+            return KeyCode.from_vk(vk)